@@ -1,27 +1,41 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from pathlib import Path
 
 WINDOWS = {"1h": 12, "3h": 36, "6h": 72}  # 5-min intervals → 12 per hour
 
 def compute_rate_of_change(df):
-    df = df.copy()
-    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"])
+    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], format="ISO8601", utc=True, cache=True)
     df = df.sort_values(["site_no", "timestamp_utc"])
 
-    # Calculate percent change using transform for index alignment
+    # Rows without a site_no (code -1) belong to no site, as groupby drops NaN keys
+    codes, _ = pd.factorize(df["site_no"], sort=True)
+    has_site = codes >= 0
+    if not has_site.all():
+        df = df[has_site].copy()
+        codes = codes[has_site]
+
+    # Percent change over a fixed lag; rows whose lagged row belongs to
+    # another site get NaN (same result as a per-site shift, without groupby)
+    flow = df["flow_cfs"].to_numpy(dtype=np.float64)
+    n = len(flow)
+    new_site = np.ones(n, dtype=bool)
+    new_site[1:] = codes[1:] != codes[:-1]
+    run_start = np.maximum.accumulate(np.where(new_site, np.arange(n), 0))
+    offset = np.arange(n) - run_start  # position of each row within its site
+
     for label, window in WINDOWS.items():
-        df[f"pct_change_{label}"] = (
-            df.groupby("site_no")["flow_cfs"]
-              .transform(lambda x: (x - x.shift(window)) / x.shift(window) * 100)
-        )
-
-    # Keep only the most recent record for each site
-    latest = (
-        df.sort_values("timestamp_utc")
-          .groupby("site_no", as_index=False)
-          .tail(1)
-          .reset_index(drop=True)
-    )
+        prev = np.full(n, np.nan)
+        prev[window:] = flow[:-window]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = (flow - prev) / prev * 100
+        df[f"pct_change_{label}"] = np.where(offset >= window, pct, np.nan)
+
+    # Keep only the most recent record for each site (rows are already
+    # sorted by site and time, so the last duplicate is the latest)
+    latest = df.drop_duplicates("site_no", keep="last").reset_index(drop=True)
 
     # Select relevant columns
     keep_cols = [
@@ -50,10 +64,11 @@ def main():
         if df.empty:
             print(f"⚠️ {region}.csv is empty — skipping.")
             continue
+        df["site_no"] = df["site_no"].astype("category")
 
         result = compute_rate_of_change(df)
         output_path = output_dir / f"{region}_rate_of_change.csv"
-        result.to_csv(output_path, index=False)
+        pacsv.write_csv(pa.Table.from_pandas(result, preserve_index=False), str(output_path))
         print(f"✅ Saved rate of change results to {output_path}")
 
     print("Done!")
@@ -9,8 +9,12 @@ Output:
 """
 
 import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from datetime import datetime
+from fetch_historical import load_historical_p90
 
 # ------------------------------
 # CONFIG
@@ -20,7 +24,7 @@ CURRENT_FILES = [
     os.path.join(DATA_DIR, "north_va.csv"),
     os.path.join(DATA_DIR, "south_va.csv")
 ]
-HISTORICAL_FILE = os.path.join(DATA_DIR, "historical_p90.csv")
+HISTORICAL_COLUMNS = ["site_no", "day_of_year", "p90_flow_cfs"]
 OUTPUT_FILE = os.path.join(DATA_DIR, "high_flow_summary.csv")
 
 # ------------------------------
@@ -33,7 +37,7 @@ def load_current_data():
     for file_path in CURRENT_FILES:
         if os.path.exists(file_path):
             region = "north" if "north" in file_path else "south"
-            df = pd.read_csv(file_path)
+            df = pd.read_csv(file_path, dtype={"site_no": str})
             df["region"] = region
             dfs.append(df)
         else:
@@ -41,33 +45,49 @@ def load_current_data():
     if not dfs:
         print("No current data found. Exiting.")
         return pd.DataFrame()
-    return pd.concat(dfs, ignore_index=True)
+    df = pd.concat(dfs, ignore_index=True)
+    # Some rows lost their leading zeros upstream, so site numbers are
+    # compared without them (the historical table gets the same treatment)
+    df["site_no"] = df["site_no"].str.lstrip("0").astype("category")
+    return df
 
 
 def prepare_current_data(df):
     """Add day-of-year column for joining with historical percentiles."""
-    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], utc=True, errors="coerce")
-    df["day_of_year"] = df["timestamp_utc"].dt.dayofyear
-    return df.dropna(subset=["day_of_year", "flow_cfs", "site_no"])
+    df["timestamp_utc"] = pd.to_datetime(
+        df["timestamp_utc"], format="ISO8601", utc=True, cache=True, errors="coerce"
+    )
+    df = df.dropna(subset=["timestamp_utc", "flow_cfs", "site_no"])
+
+    # Days since Jan 1 of the same year, straight from datetime64 arithmetic
+    ts = df["timestamp_utc"].to_numpy("datetime64[ns]")
+    doy = (ts.astype("datetime64[D]") - ts.astype("datetime64[Y]")).astype("int64") + 1
+    df["day_of_year"] = doy.astype(np.int16)
+    return df
 
 
 def compare_to_historical(df_current, df_hist):
     """Merge and compare current flow readings to 90th percentile values."""
+    # Cast both sides to one shared site_no categorical (works whether or not
+    # the inputs are already categorical) so the merge joins on integer codes
+    sites = pd.Index(df_current["site_no"].unique()).union(
+        pd.Index(df_hist["site_no"].unique())
+    ).dropna()
+    site_dtype = pd.CategoricalDtype(sites)
+    df_current = df_current.assign(site_no=df_current["site_no"].astype(site_dtype))
+    df_hist = df_hist.assign(site_no=df_hist["site_no"].astype(site_dtype))
+
     merged = pd.merge(
         df_current,
         df_hist,
         how="left",
-        left_on=["site_no", "day_of_year"],
-        right_on=["site_no", "day_of_year"],
-        suffixes=("_current", "_hist")
+        on=["site_no", "day_of_year"],
+        validate="many_to_one"
     )
 
-    # Handle possible duplicate or missing site_name columns
-    if "site_name_current" in merged.columns:
-        merged["site_name"] = merged["site_name_current"]
-    elif "site_name_hist" in merged.columns:
-        merged["site_name"] = merged["site_name_hist"]
-    elif "site_name" not in merged.columns:
+    # The historical table is projected to its keys and P90, so site_name
+    # can only come from the current data
+    if "site_name" not in merged.columns:
         merged["site_name"] = "unknown"
 
     # Calculate ratio and flag
@@ -101,33 +121,34 @@ def main():
     if df_current.empty:
         return
 
-    if not os.path.exists(HISTORICAL_FILE):
+    df_hist = load_historical_p90(columns=HISTORICAL_COLUMNS)
+    if df_hist is None:
         print("Historical file not found! Run fetch_historical_data.py first.")
         return
-
-    df_hist = pd.read_csv(HISTORICAL_FILE)
     if df_hist.empty:
         print("Historical dataset is empty. Run fetch_historical_data.py again.")
         return
+    df_hist["site_no"] = df_hist["site_no"].str.lstrip("0").astype("category")
+    df_hist = df_hist.drop_duplicates(["site_no", "day_of_year"])
 
     # Prep and compare
     df_current = prepare_current_data(df_current)
     df_results = compare_to_historical(df_current, df_hist)
 
     # Save results
-    df_results.to_csv(OUTPUT_FILE, index=False)
+    pacsv.write_csv(pa.Table.from_pandas(df_results, preserve_index=False), OUTPUT_FILE)
     print(f"Saved comparison results → {OUTPUT_FILE}")
 
     # Summary
     if "high_flow" in df_results.columns:
         high_flow_sites = (
             df_results[df_results["high_flow"]]
-            .groupby("site_no")["site_name"]
-            .first()
+            .drop_duplicates("site_no")[["site_no", "site_name"]]
+            .sort_values("site_no")
         )
         if len(high_flow_sites) > 0:
             print("\nHigh flow sites detected:")
-            for site_no, site_name in high_flow_sites.items():
+            for site_no, site_name in high_flow_sites.itertuples(index=False):
                 print(f"  - {site_no}: {site_name}")
         else:
             print("\nNo sites above 90th percentile today.")
@@ -5,13 +5,18 @@ Fetches only readings since the last timestamp.
 Keeps a rolling 24-hour window.
 Handles empty fetches safely.
 Includes latitude and longitude columns.
-Saves all data into a single CSV.
+Saves all data into a single Parquet file (typed timestamps), with a
+CSV copy alongside it.
 """
 
 import os
-import requests
+import numpy as np
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from datetime import datetime, timedelta, timezone
+from usgs_session import SESSION
 
 # ------------------------------
 # CONFIG
@@ -19,7 +24,7 @@ from datetime import datetime, timedelta, timezone
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
-DATA_FILE = os.path.join(DATA_DIR, "gauge_data.csv")
+DATA_FILE = os.path.join(DATA_DIR, "gauge_data.parquet")
 
 NWIS_IV_URL = "https://waterservices.usgs.gov/nwis/iv/"
 
@@ -43,40 +48,52 @@ def fetch_va_iv_since(start_time):
         "endDT": end_time.strftime("%Y-%m-%dT%H:%M")
     }
 
-    resp = requests.get(NWIS_IV_URL, params=params, timeout=30)
+    resp = SESSION.get(NWIS_IV_URL, params=params, timeout=30)
     resp.raise_for_status()
-    j = resp.json()
-
-    rows = []
-    for ts in j.get("value", {}).get("timeSeries", []):
-        site_no = ts["sourceInfo"]["siteCode"][0]["value"]
-        site_name = ts["sourceInfo"]["siteName"]
-        lat = ts["sourceInfo"]["geoLocation"]["geogLocation"]["latitude"]
-        lon = ts["sourceInfo"]["geoLocation"]["geogLocation"]["longitude"]
-        for v in ts["values"][0]["value"]:
+    j = orjson.loads(resp.content)
+    series = j.get("value", {}).get("timeSeries", [])
+
+    # Preallocate one array per column and fill each site's slice in place
+    total = sum(len(ts["values"][0]["value"]) for ts in series)
+    site_no = np.empty(total, dtype=object)
+    site_name = np.empty(total, dtype=object)
+    timestamp = np.empty(total, dtype=object)
+    flow = np.empty(total, dtype=np.float64)
+    lat = np.empty(total, dtype=np.float64)
+    lon = np.empty(total, dtype=np.float64)
+
+    start = 0
+    for ts in series:
+        values = ts["values"][0]["value"]
+        end = start + len(values)
+        site_no[start:end] = ts["sourceInfo"]["siteCode"][0]["value"]
+        site_name[start:end] = ts["sourceInfo"]["siteName"]
+        lat[start:end] = ts["sourceInfo"]["geoLocation"]["geogLocation"]["latitude"]
+        lon[start:end] = ts["sourceInfo"]["geoLocation"]["geogLocation"]["longitude"]
+        for i, v in enumerate(values, start):
             try:
-                flow = float(v["value"])
+                flow[i] = float(v["value"])
             except (TypeError, ValueError):
-                flow = None
-            timestamp = v["dateTime"]
-            rows.append({
-                "site_no": site_no,
-                "site_name": site_name,
-                "timestamp_utc": timestamp,
-                "flow_cfs": flow,
-                "latitude": lat,
-                "longitude": lon
-            })
-    df = pd.DataFrame(rows)
+                flow[i] = np.nan
+            timestamp[i] = v["dateTime"]
+        start = end
+
+    df = pd.DataFrame({
+        "site_no": site_no,
+        "site_name": site_name,
+        "timestamp_utc": timestamp,
+        "flow_cfs": flow,
+        "latitude": lat,
+        "longitude": lon
+    })
     return df
 
 def load_last_timestamp(file_path):
     """
-    Get the last timestamp from an existing CSV or return 24h ago if file missing
+    Get the last timestamp from an existing Parquet file or return 24h ago if file missing
     """
     if os.path.exists(file_path):
-        df = pd.read_csv(file_path)
-        df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], utc=True)
+        df = pd.read_parquet(file_path, engine="pyarrow", columns=["timestamp_utc"])
         last_time = df["timestamp_utc"].max()
         # Add 1 second to avoid duplicate
         return last_time + timedelta(seconds=1)
@@ -85,19 +102,31 @@ def load_last_timestamp(file_path):
 
 def append_and_trim(df_new, file_path, hours=24):
     """
-    Append new data to CSV and keep only last X hours
+    Append new data to the Parquet file and keep only last X hours.
+    A CSV copy is written next to it for consumers that expect CSV.
     """
     cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours)
 
+    # Only the new rows need parsing; stored timestamps are already typed
+    df_new = df_new.assign(
+        timestamp_utc=pd.to_datetime(df_new["timestamp_utc"], format="ISO8601", utc=True, cache=True)
+    ).sort_values("timestamp_utc", kind="stable")
+    new_idx = df_new["timestamp_utc"].searchsorted(cutoff_time, side="left")
+
+    # History is kept sorted by timestamp (new rows are never older than
+    # stored ones), so the trim point is a binary search, not a mask
     if os.path.exists(file_path):
-        df_old = pd.read_csv(file_path)
-        df_all = pd.concat([df_old, df_new], ignore_index=True)
+        df_old = pd.read_parquet(file_path, engine="pyarrow")
+        if not df_old["timestamp_utc"].is_monotonic_increasing:
+            df_old = df_old.sort_values("timestamp_utc", kind="stable")
+        old_idx = df_old["timestamp_utc"].searchsorted(cutoff_time, side="left")
+        df_all = pd.concat([df_old.iloc[old_idx:], df_new.iloc[new_idx:]], ignore_index=True)
     else:
-        df_all = df_new.copy()
+        df_all = df_new.iloc[new_idx:].reset_index(drop=True)
 
-    df_all["timestamp_utc"] = pd.to_datetime(df_all["timestamp_utc"], format="ISO8601", utc=True)
-    df_all = df_all[df_all["timestamp_utc"] >= cutoff_time]
-    df_all.to_csv(file_path, index=False)
+    df_all.to_parquet(file_path, engine="pyarrow", compression="snappy", index=False)
+    csv_path = os.path.splitext(file_path)[0] + ".csv"
+    pacsv.write_csv(pa.Table.from_pandas(df_all, preserve_index=False), csv_path)
     print(f"Saved {len(df_all)} rows to {file_path}")
 
 # ------------------------------
@@ -6,15 +6,19 @@ from USGS NWIS Daily Values service. Computes 90th percentile flow for
 each day of year across 20 years per site.
 
 Output:
-    data/historical_p90.csv
+    data/historical_p90.parquet (and a CSV copy)
     Columns: site_no, site_name, day_of_year, p90_flow_cfs, north_south
 """
 
 import os
-import time
-import requests
+import numpy as np
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from usgs_session import SESSION
 
 # ------------------------------
 # CONFIG
@@ -22,19 +26,22 @@ from datetime import datetime, timedelta
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
-HISTORICAL_FILE = os.path.join(DATA_DIR, "historical_p90.csv")
+HISTORICAL_FILE = os.path.join(DATA_DIR, "historical_p90.parquet")
+HISTORICAL_CSV = os.path.join(DATA_DIR, "historical_p90.csv")
 NWIS_DV_URL = "https://waterservices.usgs.gov/nwis/dv/"
 LATITUDE_MIDPOINT = 37.5  # split between north/south VA
 PARAMETER_CD = "00060"    # discharge (cfs)
 YEARS_BACK = 20
+MAX_WORKERS = 4           # parallel chunk requests to USGS (<= session pool size)
 
 # ------------------------------
 # HELPER FUNCTIONS
 # ------------------------------
 
-def fetch_va_dv_chunk(start_date, end_date):
+def fetch_va_dv_chunk(start_date, end_date, session=SESSION):
     """
     Fetch daily discharge data for all VA sites within a date range.
+    Uses the shared USGS session unless another one is passed.
     Returns a DataFrame with columns:
         site_no, site_name, date, flow_cfs, lat
     """
@@ -49,11 +56,13 @@ def fetch_va_dv_chunk(start_date, end_date):
     }
 
     print(f"Fetching {start_date.date()} → {end_date.date()} ...")
-    resp = requests.get(NWIS_DV_URL, params=params, timeout=60)
+    resp = session.get(NWIS_DV_URL, params=params, timeout=60)
     resp.raise_for_status()
-    j = resp.json()
+    j = orjson.loads(resp.content)
 
-    rows = []
+    # Build columns directly; the schema is fixed, so there is no need for
+    # pandas to union keys and infer types across a list of row dicts
+    site_no_l, site_name_l, date_l, flow_l, lat_l = [], [], [], [], []
     for ts in j.get("value", {}).get("timeSeries", []):
         site_no = ts["sourceInfo"]["siteCode"][0]["value"]
         site_name = ts["sourceInfo"]["siteName"]
@@ -67,35 +76,49 @@ def fetch_va_dv_chunk(start_date, end_date):
                 flow = float(val_str)
             except ValueError:
                 continue
-            date = v["dateTime"][:10]
-            rows.append({
-                "site_no": site_no,
-                "site_name": site_name,
-                "date": date,
-                "flow_cfs": flow,
-                "lat": lat
-            })
-
-    df = pd.DataFrame(rows)
+            site_no_l.append(site_no)
+            site_name_l.append(site_name)
+            date_l.append(v["dateTime"][:10])
+            flow_l.append(flow)
+            lat_l.append(lat)
+
+    df = pd.DataFrame({
+        "site_no": site_no_l,
+        "site_name": site_name_l,
+        "date": date_l,
+        "flow_cfs": np.asarray(flow_l, dtype=np.float64),
+        "lat": np.asarray(lat_l, dtype=np.float64)
+    })
     return df
 
 
 def fetch_historical_data(years_back=YEARS_BACK, chunk_years=5):
     """
     Fetch historical daily discharge data in multi-year chunks to avoid API limits.
+    Chunks are requested in parallel over a shared keep-alive session.
     """
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=years_back * 365)
 
-    all_dfs = []
+    ranges = []
     cur_start = start_date
     while cur_start < end_date:
         cur_end = min(cur_start + timedelta(days=chunk_years * 365), end_date)
-        df_chunk = fetch_va_dv_chunk(cur_start, cur_end)
-        if not df_chunk.empty:
-            all_dfs.append(df_chunk)
+        ranges.append((cur_start, cur_end))
         cur_start = cur_end + timedelta(days=1)
-        time.sleep(1)  # be nice to the USGS server
+
+    # Keep the worker count small to stay polite to the USGS server
+    chunks = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {
+            ex.submit(fetch_va_dv_chunk, s, e): i
+            for i, (s, e) in enumerate(ranges)
+        }
+        for future in as_completed(futures):
+            chunks[futures[future]] = future.result()
+
+    # Concatenate in date order regardless of completion order
+    all_dfs = [chunks[i] for i in sorted(chunks) if not chunks[i].empty]
 
     if all_dfs:
         return pd.concat(all_dfs, ignore_index=True)
@@ -103,19 +126,62 @@ def fetch_historical_data(years_back=YEARS_BACK, chunk_years=5):
         return pd.DataFrame()
 
 
+def load_historical_p90(columns=None):
+    """
+    Load the historical P90 table, preferring Parquet over the CSV copy.
+    site_no is kept as a zero-padded string. Returns None if neither file exists.
+    """
+    if os.path.exists(HISTORICAL_FILE):
+        return pd.read_parquet(HISTORICAL_FILE, engine="pyarrow", columns=columns)
+    if os.path.exists(HISTORICAL_CSV):
+        return pd.read_csv(HISTORICAL_CSV, usecols=columns, dtype={"site_no": str})
+    return None
+
+
 def compute_p90_by_day(df):
     """
     Compute 90th percentile discharge per day-of-year per site.
     """
-    df["date"] = pd.to_datetime(df["date"])
-    df["day_of_year"] = df["date"].dt.dayofyear
-    df["north_south"] = df["lat"].apply(lambda x: "north" if x >= LATITUDE_MIDPOINT else "south")
-
-    grouped = (
-        df.groupby(["site_no", "site_name", "north_south", "day_of_year"])["flow_cfs"]
-        .quantile(0.9)
-        .reset_index(name="p90_flow_cfs")
-    )
+    df["date"] = pd.to_datetime(df["date"], format="ISO8601", cache=True)
+    dates = df["date"].to_numpy("datetime64[ns]")
+    doy = (dates.astype("datetime64[D]") - dates.astype("datetime64[Y]")).astype("int64") + 1
+    df["day_of_year"] = doy.astype(np.int16)
+    df["north_south"] = np.where(df["lat"].to_numpy() >= LATITUDE_MIDPOINT, "north", "south")
+
+    df = df.dropna(subset=["flow_cfs"])
+
+    # Rows without a site_no (code -1) belong to no site, as groupby drops NaN keys
+    site_codes, site_nos = pd.factorize(df["site_no"], sort=True)
+    has_site = site_codes >= 0
+    df = df[has_site]
+    site_codes = site_codes[has_site]
+
+    # Sort flows within each (site, day_of_year) group so the 90th percentile
+    # can be read off by position, matching pandas' linear interpolation
+    group = site_codes.astype(np.int64) * 367 + df["day_of_year"].to_numpy()
+    flow = df["flow_cfs"].to_numpy(dtype=np.float64)
+    order = np.lexsort((flow, group))
+    group = group[order]
+    flow = flow[order]
+
+    starts = np.flatnonzero(np.diff(group, prepend=-1) != 0)
+    counts = np.diff(np.r_[starts, len(group)])
+    pos = (counts - 1) * 0.9
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    p90 = flow[starts + lo] + (flow[starts + hi] - flow[starts + lo]) * (pos - lo)
+
+    # Site name and north/south come from each site's first record
+    first = np.unique(site_codes, return_index=True)[1]
+    group_sites = group[starts] // 367
+
+    grouped = pd.DataFrame({
+        "site_no": site_nos[group_sites],
+        "site_name": df["site_name"].to_numpy()[first][group_sites],
+        "north_south": df["north_south"].to_numpy()[first][group_sites],
+        "day_of_year": group[starts] % 367,
+        "p90_flow_cfs": p90
+    })
     return grouped
 
 
@@ -134,7 +200,8 @@ def main():
         return
 
     df_p90 = compute_p90_by_day(df)
-    df_p90.to_csv(HISTORICAL_FILE, index=False)
+    df_p90.to_parquet(HISTORICAL_FILE, engine="pyarrow", compression="snappy", index=False)
+    pacsv.write_csv(pa.Table.from_pandas(df_p90, preserve_index=False), HISTORICAL_CSV)
 
     print(f"Saved 90th percentile dataset → {HISTORICAL_FILE}")
     print(f"{len(df_p90)} site-day combinations computed.")
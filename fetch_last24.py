@@ -3,12 +3,18 @@ fetch_last24.py - Fetch last 24 hours of VA discharge data for testing
 
 Fetches USGS IV data for all VA gauges for the past 24 hours.
 Splits into North/South CSVs for testing.
+Also writes a Parquet dataset partitioned by site_no for per-site reads.
 """
 
 import os
-import requests
+import shutil
+import numpy as np
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from datetime import datetime, timedelta, timezone
+from usgs_session import SESSION
 
 # ------------------------------
 # CONFIG
@@ -18,6 +24,7 @@ os.makedirs(DATA_DIR, exist_ok=True)
 
 NORTH_FILE = os.path.join(DATA_DIR, "north_va_last24.csv")
 SOUTH_FILE = os.path.join(DATA_DIR, "south_va_last24.csv")
+BY_SITE_DIR = os.path.join(DATA_DIR, "by_site")
 
 NWIS_IV_URL = "https://waterservices.usgs.gov/nwis/iv/"
 LATITUDE_MIDPOINT = 37.5  # VA split north/south
@@ -44,34 +51,47 @@ def fetch_va_iv_last24():
     }
 
     print("Fetching last 24 hours of data from USGS IV...")
-    resp = requests.get(NWIS_IV_URL, params=params, timeout=30)
+    resp = SESSION.get(NWIS_IV_URL, params=params, timeout=30)
     resp.raise_for_status()
-    j = resp.json()
+    j = orjson.loads(resp.content)
+    series = j.get("value", {}).get("timeSeries", [])
 
-    rows = []
-    for ts in j.get("value", {}).get("timeSeries", []):
-        site_no = ts["sourceInfo"]["siteCode"][0]["value"]
-        site_name = ts["sourceInfo"]["siteName"]
+    # Preallocate one array per column and fill each site's slice in place
+    total = sum(len(ts["values"][0]["value"]) for ts in series)
+    site_no = np.empty(total, dtype=object)
+    site_name = np.empty(total, dtype=object)
+    timestamp = np.empty(total, dtype=object)
+    flow = np.empty(total, dtype=np.float64)
+    north_south = np.empty(total, dtype=object)
+
+    start = 0
+    for ts in series:
+        values = ts["values"][0]["value"]
+        end = start + len(values)
         lat = ts["sourceInfo"]["geoLocation"]["geogLocation"]["latitude"]
-        for v in ts["values"][0]["value"]:
+        site_no[start:end] = ts["sourceInfo"]["siteCode"][0]["value"]
+        site_name[start:end] = ts["sourceInfo"]["siteName"]
+        north_south[start:end] = "north" if lat >= LATITUDE_MIDPOINT else "south"
+        for i, v in enumerate(values, start):
             try:
-                flow = float(v["value"])
+                flow[i] = float(v["value"])
             except (TypeError, ValueError):
-                flow = None
-            timestamp = v["dateTime"]
-            rows.append({
-                "site_no": site_no,
-                "site_name": site_name,
-                "timestamp_utc": timestamp,
-                "flow_cfs": flow,
-                "north_south": "north" if lat >= LATITUDE_MIDPOINT else "south"
-            })
-    df = pd.DataFrame(rows)
+                flow[i] = np.nan
+            timestamp[i] = v["dateTime"]
+        start = end
+
+    df = pd.DataFrame({
+        "site_no": site_no,
+        "site_name": site_name,
+        "timestamp_utc": timestamp,
+        "flow_cfs": flow,
+        "north_south": north_south
+    })
     return df
 
 def save_north_south(df):
     """
-    Save north/south data to separate CSVs
+    Save north/south data to separate CSVs, plus one Parquet partition per site
     """
     if df.empty:
         print("No data fetched for the last 24 hours.")
@@ -79,11 +99,17 @@ def save_north_south(df):
 
     north_df = df[df["north_south"] == "north"].drop(columns=["north_south"])
     south_df = df[df["north_south"] == "south"].drop(columns=["north_south"])
-    north_df.to_csv(NORTH_FILE, index=False)
-    south_df.to_csv(SOUTH_FILE, index=False)
+    pacsv.write_csv(pa.Table.from_pandas(north_df, preserve_index=False), NORTH_FILE)
+    pacsv.write_csv(pa.Table.from_pandas(south_df, preserve_index=False), SOUTH_FILE)
     print(f"Saved {len(north_df)} rows to {NORTH_FILE}")
     print(f"Saved {len(south_df)} rows to {SOUTH_FILE}")
 
+    # Rebuild the dataset from scratch so sites that stopped reporting
+    # don't keep serving stale partitions
+    shutil.rmtree(BY_SITE_DIR, ignore_errors=True)
+    df.to_parquet(BY_SITE_DIR, engine="pyarrow", partition_cols=["site_no"])
+    print(f"Saved {df['site_no'].nunique()} site partitions to {BY_SITE_DIR}")
+
 # ------------------------------
 # MAIN
 # ------------------------------
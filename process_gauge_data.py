@@ -1,24 +1,28 @@
 """
 process_gauge_data.py
 
-1. Reads gauge_data.csv from data/ (output of fetch_data.py)
+1. Reads gauge_data.parquet from data/ (output of fetch_data.py)
 2. Computes 1h, 3h, 6h percent change for each site
 3. Compares latest readings to historical 90th percentile (P90)
 4. Outputs a single CSV with one row per gauge
 """
 
 import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from pathlib import Path
 from datetime import datetime
+from fetch_historical import HISTORICAL_FILE, load_historical_p90
 
 # ------------------------------
 # CONFIG
 # ------------------------------
 DATA_DIR = Path("data")
-GAUGE_FILE = DATA_DIR / "gauge_data.csv"
-HISTORICAL_FILE = DATA_DIR / "historical_p90.csv"
+GAUGE_FILE = DATA_DIR / "gauge_data.parquet"
 OUTPUT_FILE = DATA_DIR / "gauge_data_processed.csv"
+HISTORICAL_COLUMNS = ["site_no", "day_of_year", "p90_flow_cfs"]
 
 WINDOWS = {"1h": 12, "3h": 36, "6h": 72}  # 5-min intervals → 12 per hour
 
@@ -26,45 +30,58 @@ WINDOWS = {"1h": 12, "3h": 36, "6h": 72}  # 5-min intervals → 12 per hour
 # HELPER FUNCTIONS
 # ------------------------------
 
+def load_historical():
+    """Load historical P90 flows, preferring Parquet over the legacy CSV"""
+    df = load_historical_p90(columns=HISTORICAL_COLUMNS)
+    if df is None:
+        return None
+    df["site_no"] = df["site_no"].astype("category")
+    return df.drop_duplicates(["site_no", "day_of_year"])
+
 def compute_rate_of_change(df):
-    df = df.copy()
-    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], utc=True)
+    """Return the most recent reading per site with 1h, 3h, 6h percent change"""
+    # timestamp_utc is already datetime64[ns, UTC] when read from Parquet
     df = df.sort_values(["site_no", "timestamp_utc"])
 
-    # Calculate percent change for each window
+    flow = df["flow_cfs"].to_numpy(dtype=np.float64)
+    codes, _ = pd.factorize(df["site_no"], sort=True)  # -1 marks a missing site_no
+
+    # Last usable row of each site (rows sorted by site, then time)
+    usable = df["timestamp_utc"].notna().to_numpy() & ~np.isnan(flow) & (codes >= 0)
+    rows = np.flatnonzero(usable)
+    is_last = np.ones(len(rows), dtype=bool)
+    is_last[:-1] = codes[rows[1:]] != codes[rows[:-1]]
+    last = rows[is_last]
+
+    # Percent change against the reading `window` rows earlier, if it is
+    # from the same site
+    latest = df.iloc[last].copy()
     for label, window in WINDOWS.items():
-        df[f"pct_change_{label}"] = (
-            df.groupby("site_no")["flow_cfs"]
-              .transform(lambda x: (x - x.shift(window)) / x.shift(window) * 100)
-        )
+        lag = np.maximum(last - window, 0)
+        same = (last >= window) & (codes[lag] == codes[last])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = (flow[last] - flow[lag]) / flow[lag] * 100
+        latest[f"pct_change_{label}"] = np.where(same, pct, np.nan)
 
-    return df
+    return latest
 
 def prepare_current_data(df):
     """Add day-of-year column for historical comparison"""
-    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], utc=True, errors="coerce")
-    df["day_of_year"] = df["timestamp_utc"].dt.dayofyear
-    return df.dropna(subset=["day_of_year", "flow_cfs", "site_no"])
+    ts = df["timestamp_utc"].to_numpy("datetime64[ns]")
+    doy = (ts.astype("datetime64[D]") - ts.astype("datetime64[Y]")).astype("int64") + 1
+    df["day_of_year"] = doy.astype(np.int16)
+    return df
 
 def compare_to_historical(df_current, df_hist):
-    """Merge with historical P90 flows and compute percentile ratio"""
-    merged = pd.merge(
-        df_current,
-        df_hist,
-        how="left",
-        left_on=["site_no", "day_of_year"],
-        right_on=["site_no", "day_of_year"],
-        suffixes=("", "_hist")
-    )
-
-    # Use site_name from current or fallback to historical
-    if "site_name" not in merged.columns and "site_name_hist" in merged.columns:
-        merged["site_name"] = merged["site_name_hist"]
+    """Look up historical P90 flows and compute percentile ratio"""
+    p90 = dict(zip(zip(df_hist["site_no"], df_hist["day_of_year"]), df_hist["p90_flow_cfs"]))
+    keys = zip(df_current["site_no"], df_current["day_of_year"])
+    df_current["p90_flow_cfs"] = [p90.get(k, np.nan) for k in keys]
 
     # Compute percentile ratio
-    merged["percentile"] = merged["flow_cfs"] / merged["p90_flow_cfs"]
+    df_current["percentile"] = df_current["flow_cfs"] / df_current["p90_flow_cfs"]
 
-    return merged
+    return df_current
 
 # ------------------------------
 # MAIN
@@ -78,34 +95,27 @@ def main():
         print(f"Gauge data not found at {GAUGE_FILE}. Run fetch_data.py first.")
         return
 
-    df_current = pd.read_csv(GAUGE_FILE)
+    df_current = pd.read_parquet(GAUGE_FILE, engine="pyarrow")
+    df_current["site_no"] = df_current["site_no"].astype("category")
     if df_current.empty:
         print("Gauge data is empty. Exiting.")
         return
 
-    # Compute percent changes
+    # Compute percent changes (one row per gauge from here on)
     df_current = compute_rate_of_change(df_current)
 
     # Prepare for historical comparison
     df_current = prepare_current_data(df_current)
 
-    # Merge with historical P90 if available
-    if HISTORICAL_FILE.exists():
-        df_hist = pd.read_csv(HISTORICAL_FILE)
+    # Look up historical P90 if available
+    df_hist = load_historical()
+    if df_hist is not None:
         df_final = compare_to_historical(df_current, df_hist)
     else:
         print(f"Historical P90 file not found at {HISTORICAL_FILE}. Skipping percentile calculation.")
-        df_final = df_current.copy()
+        df_final = df_current
         df_final["percentile"] = pd.NA
 
-    # Keep only the most recent record per gauge
-    df_final["timestamp_utc"] = pd.to_datetime(df_final["timestamp_utc"], utc=True)
-    df_final = (
-        df_final.sort_values("timestamp_utc")
-                .groupby("site_no", as_index=False)
-                .tail(1)
-    )
-
     # Select final columns
     columns = [
         "site_no",
@@ -122,7 +132,7 @@ def main():
     df_final = df_final[[c for c in columns if c in df_final.columns]]
 
     # Save final CSV
-    df_final.to_csv(OUTPUT_FILE, index=False)
+    pacsv.write_csv(pa.Table.from_pandas(df_final, preserve_index=False), str(OUTPUT_FILE))
     print(f"✅ Saved processed gauge data to {OUTPUT_FILE}")
 
 if __name__ == "__main__":
@@ -1,6 +1,5 @@
 # update_pipeline_import.py
 import os
-import pandas as pd
 from datetime import datetime
 
 # Import the main functions
@@ -11,18 +10,24 @@ from fetch_historical import main as historical_main  # Make sure filename match
 
 LOG_FILE = "update_log.csv"
 MAX_LOG_RECORDS = 100
+LOG_LINE_BYTES = 27  # "YYYY-MM-DD HH:MM:SS.ffffff\n"
+MAX_LOG_BYTES = 2 * MAX_LOG_RECORDS * LOG_LINE_BYTES  # trim at ~2x the record limit
 
 def log_update():
-    """Append an update timestamp and keep only the last 100 records."""
+    """Append an update timestamp; the log holds between 100 and 200 records."""
     timestamp = datetime.utcnow()
-    if os.path.exists(LOG_FILE):
-        df_log = pd.read_csv(LOG_FILE)
-    else:
-        df_log = pd.DataFrame(columns=["timestamp_utc"])
-    
-    df_log = pd.concat([df_log, pd.DataFrame({"timestamp_utc": [timestamp]})], ignore_index=True)
-    df_log = df_log.tail(MAX_LOG_RECORDS)
-    df_log.to_csv(LOG_FILE, index=False)
+    new_file = not os.path.exists(LOG_FILE) or os.path.getsize(LOG_FILE) == 0
+    with open(LOG_FILE, "a") as f:
+        if new_file:
+            f.write("timestamp_utc\n")
+        f.write(f"{timestamp}\n")
+
+    # Only rewrite the file occasionally, when it has outgrown the limit
+    if os.path.getsize(LOG_FILE) > MAX_LOG_BYTES:
+        with open(LOG_FILE) as f:
+            lines = f.readlines()
+        with open(LOG_FILE, "w") as f:
+            f.writelines([lines[0]] + lines[1:][-MAX_LOG_RECORDS:])
     print(f"✅ Logged update at {timestamp}")
 
 def historical_check():
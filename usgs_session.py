@@ -0,0 +1,25 @@
+"""
+usgs_session.py - Shared HTTP session for USGS NWIS requests
+
+Keeps one keep-alive connection pool, with retries on transient gateway
+errors, for fetch_data.py, fetch_last24.py and fetch_historical.py.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ------------------------------
+# CONFIG
+# ------------------------------
+POOL_SIZE = 8
+
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=POOL_SIZE,
+        pool_maxsize=POOL_SIZE,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+    )
+)
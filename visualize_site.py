@@ -2,6 +2,8 @@
 
 # visualize.py - Plot streamflow for a given site
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 import matplotlib.pyplot as plt
 from pathlib import Path
 import sys
@@ -12,18 +14,43 @@ import sys
 DATA_DIR = Path("data")
 NORTH_FILE = DATA_DIR / "north_va.csv"
 SOUTH_FILE = DATA_DIR / "south_va.csv"
+BY_SITE_DIR = DATA_DIR / "by_site"  # written by fetch_last24.py
 PLOTS_DIR = Path("plots")
 PLOTS_DIR.mkdir(exist_ok=True, parents=True)
 
 # ------------------------------
 # HELPER FUNCTIONS
 # ------------------------------
+def load_site_partition(site_no):
+    """Read only the by_site partition for site_no, return DataFrame and region"""
+    if not BY_SITE_DIR.exists():
+        return pd.DataFrame(), None
+    df = pd.read_parquet(
+        BY_SITE_DIR,
+        engine="pyarrow",
+        filters=[("site_no", "=", site_no)],
+        # Keep site numbers as strings so leading zeros survive
+        partitioning=ds.partitioning(pa.schema([("site_no", pa.string())]), flavor="hive")
+    )
+    if df.empty:
+        return df, None
+    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], format="ISO8601", utc=True, cache=True)
+    return df.sort_values("timestamp_utc"), df["north_south"].iloc[0]
+
 def load_data(site_name_or_no):
-    """Load CSV containing the site, return DataFrame and region"""
+    """Load data for the site, return DataFrame and region"""
+    df_site, region = load_site_partition(site_name_or_no)
+    if not df_site.empty:
+        return df_site, region
+
+    # Fall back to scanning the regional CSVs (e.g. lookup by site name)
     for file_path, region in [(NORTH_FILE, "north"), (SOUTH_FILE, "south")]:
         if file_path.exists():
             df = pd.read_csv(file_path)
-            df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"])
+            df["site_no"] = df["site_no"].astype("category")
+            df["timestamp_utc"] = pd.to_datetime(
+                df["timestamp_utc"], format="ISO8601", utc=True, cache=True
+            )
             mask = (df["site_name"] == site_name_or_no) | (df["site_no"] == site_name_or_no)
             df_site = df[mask]
             if not df_site.empty: